@@ -1,31 +1,47 @@
 from bs4 import BeautifulSoup
+from selectolax.parser import HTMLParser
 import requests
 import pytest
 
 from .exceptions import ArticleNotFound
-from .html_tools import remove_buzz_attrs, remove_buzz_tags, remove_all_tags
-
-
-def sanitize(html, plaintext=False):
+from .html_tools import (
+    DEFAULT_BLACKLIST_TAGS,
+    remove_buzz_attrs,
+    remove_buzz_tags,
+    remove_all_tags,
+)
+
+ARTICLE_SELECTOR = "div.layout-article"
+
+BUZZ_SELECTORS = [
+    ".article__notice",
+    ".article__aggr",
+    "aside",
+    ".media__copyright",
+    ".article__meta",
+    ".article__info",
+    ".article__tags",
+]
+
+
+def _extract_article(html):
     soup = BeautifulSoup(html, "html.parser")
-    article = soup.select_one("div.layout-article")
+    article = soup.select_one(ARTICLE_SELECTOR)
 
     if not article:
         raise ArticleNotFound()
 
     article.attrs = {}
 
-    buzz_blocks = [
-        *article.select(".article__notice"),
-        *article.select(".article__aggr"),
-        *article.select("aside"),
-        *article.select(".media__copyright"),
-        *article.select(".article__meta"),
-        *article.select(".article__info"),
-        *article.select(".article__tags"),
-    ]
-    for el in buzz_blocks:
-        el.decompose()
+    for selector in BUZZ_SELECTORS:
+        for el in article.select(selector):
+            el.decompose()
+
+    return article
+
+
+def sanitize(html, plaintext=False):
+    article = _extract_article(html)
 
     remove_buzz_attrs(article)
     remove_buzz_tags(article)
@@ -38,6 +54,28 @@ def sanitize(html, plaintext=False):
     return text.strip()
 
 
+def sanitize_tokens(html):
+    """Выдает сырые токены статьи по мере обхода текстовых узлов,
+    не собирая весь текст в одну строку.
+
+    Горячий путь сервера, поэтому парсим selectolax'ом (C-движок Modest):
+    он в разы быстрее html.parser и почти не аллоцирует. BeautifulSoup
+    остается в sanitize, которому нужен вывод с сохранением тегов."""
+    tree = HTMLParser(html)
+    article = tree.css_first(ARTICLE_SELECTOR)
+
+    if article is None:
+        raise ArticleNotFound()
+
+    for selector in [*BUZZ_SELECTORS, *DEFAULT_BLACKLIST_TAGS]:
+        for node in article.css(selector):
+            node.decompose()
+
+    for node in article.traverse(include_text=True):
+        if node.tag == "-text":
+            yield from node.text_content.split()
+
+
 def test_sanitize():
     resp = requests.get("https://inosmi.ru/economic/20190629/245384784.html")
     resp.raise_for_status()
@@ -0,0 +1,25 @@
+import marshal
+
+import pymorphy3
+
+# Прекомпиляция словаря "заряженных" слов: читаем negative.txt, приводим
+# каждое слово к нормальной форме и сохраняем готовые леммы в marshal-файл.
+# Сервер при старте загружает его одним marshal.load вместо построчного
+# чтения и лемматизации.
+SOURCE_PATH = "charged_dict/negative.txt"
+COMPILED_PATH = "charged_dict/negative.marshal"
+
+
+def build_dict(source_path=SOURCE_PATH, compiled_path=COMPILED_PATH):
+    morph = pymorphy3.MorphAnalyzer()
+    with open(source_path, "r", encoding="utf-8") as f:
+        words = [line.strip() for line in f if line.strip()]
+    lemmas = sorted({morph.parse(word)[0].normal_form for word in words})
+    with open(compiled_path, "wb") as f:
+        marshal.dump(lemmas, f)
+    return lemmas
+
+
+if __name__ == "__main__":
+    lemmas = build_dict()
+    print(f"Сохранено {len(lemmas)} лемм в {COMPILED_PATH}")
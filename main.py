@@ -1,26 +1,36 @@
 import aiohttp
 import asyncio
 import argparse
+import sys
+
 import pymorphy3
 import text_tools
+
+try:
+    import uvloop
+except ImportError:  # uvloop не собирается под Windows
+    uvloop = None
 from adapters.inosmi_ru import sanitize
 from adapters.exceptions import ArticleNotFound
 
 # Настройки по умолчанию
 FETCH_TIMEOUT = 5
 ANALYZE_TIMEOUT = 3
+FETCH_CLIENT_TIMEOUT = aiohttp.ClientTimeout(total=FETCH_TIMEOUT)
 
 
 def load_charged_words(file_path):
     with open(file_path, "r", encoding="utf-8") as f:
-        return [line.strip() for line in f if line.strip()]
+        return frozenset(line.strip() for line in f if line.strip())
 
 
 async def fetch(session, url):
-    timeout = aiohttp.ClientTimeout(total=FETCH_TIMEOUT)
-    async with session.get(url, timeout=timeout) as response:
+    async with session.get(url, timeout=FETCH_CLIENT_TIMEOUT) as response:
         response.raise_for_status()
-        return await response.text()
+        # Декодируем сами: кодировка из Content-Type или UTF-8,
+        # без chardet-скана всего тела в response.text()
+        raw = await response.read()
+        return raw.decode(response.charset or "utf-8", errors="replace")
 
 
 async def process_article(session, morph, charged_words, url):
@@ -31,17 +41,17 @@ async def process_article(session, morph, charged_words, url):
 
         # Выносим вычисления в поток, чтобы не блокировать Event Loop
         loop = asyncio.get_running_loop()
-        score, words_count = await asyncio.wait_for(
+        words = await asyncio.wait_for(
             loop.run_in_executor(None, text_tools.split_by_words, morph, clean_text),
             timeout=ANALYZE_TIMEOUT,
         )
         # Вторая часть вычислений (рейтинг)
-        score = text_tools.calculate_jaundice_rate(score, charged_words)
+        score = text_tools.calculate_jaundice_rate(words, charged_words)
 
         return {
             "url": url,
             "score": score,
-            "words_count": len(words_count) if isinstance(words_count, list) else 0,
+            "words_count": len(words),
             "status": "OK",
         }
     except asyncio.TimeoutError:
@@ -54,6 +64,15 @@ async def process_article(session, morph, charged_words, url):
         return {"url": url, "status": f"ERROR: {e}"}
 
 
+def format_result(result):
+    """Возвращает двухстрочный блок отчета по одной статье."""
+    if result["status"] == "OK":
+        details = f"Результат: {result['score']}% (слов: {result['words_count']})"
+    else:
+        details = f"Статус: {result['status']}"
+    return f"\nURL: {result['url']}\n{details}"
+
+
 async def main():
     parser = argparse.ArgumentParser(
         description="Анализатор желтушности статей ИНОСМИ.РУ"
@@ -64,19 +83,21 @@ async def main():
     morph = pymorphy3.MorphAnalyzer()
     charged_words = load_charged_words("charged_dict/negative.txt")
 
-    async with aiohttp.ClientSession() as session:
+    # Keep-alive и кэш DNS, чтобы статьи с одного хоста не открывали
+    # по новому TLS-хендшейку каждая
+    connector = aiohttp.TCPConnector(limit_per_host=10, ttl_dns_cache=300)
+    async with aiohttp.ClientSession(connector=connector) as session:
         tasks = [
             process_article(session, morph, charged_words, url) for url in args.urls
         ]
         results = await asyncio.gather(*tasks)
 
-        for res in results:
-            print(f"\nURL: {res['url']}")
-            if res["status"] == "OK":
-                print(f"Результат: {res['score']}% (слов: {res['words_count']})")
-            else:
-                print(f"Статус: {res['status']}")
+        # Один write вместо 2-3 print на статью: один захват блокировки
+        # stdout и один syscall на весь отчет
+        sys.stdout.write("\n".join(format_result(res) for res in results) + "\n")
 
 
 if __name__ == "__main__":
+    if uvloop is not None:
+        uvloop.install()
     asyncio.run(main())
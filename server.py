@@ -1,74 +1,236 @@
+import argparse
 import asyncio
+import collections
+import json
 import logging
+import marshal
+import multiprocessing
+import os
+import sys
+import threading
 import time
-from concurrent.futures import ProcessPoolExecutor
-from typing import Dict, Any, List, Tuple
+import urllib.parse
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, Any, FrozenSet, List, Tuple
 
 import aiohttp
 import pymorphy3
 from aiohttp import web
 
-import text_tools
+import build_dict
+import text_tools_fast
+
+try:
+    import uvloop
+except ImportError:  # uvloop не собирается под Windows
+    uvloop = None
 from adapters.exceptions import ArticleNotFound
-from adapters.inosmi_ru import sanitize
+from adapters.inosmi_ru import sanitize_tokens
 
 # Настройки
 FETCH_TIMEOUT = 5
 ANALYZE_TIMEOUT = 3
 MAX_URLS = 10
+CACHE_TTL = 3600
+CACHE_MAX_SIZE = 1024
+PER_HOST_LIMIT = 3
 CONCURRENCY_LIMIT = asyncio.Semaphore(10)
+# Один объект таймаута на все запросы вместо аллокации на каждый вызов
+FETCH_CLIENT_TIMEOUT = aiohttp.ClientTimeout(total=FETCH_TIMEOUT)
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 
-# Глобальный кэш для морфолога внутри воркера (чтобы не инициализировать на каждый чих)
-_morph_analyzer = None
+# Морфолог на каждый воркер (поток или процесс), чтобы не инициализировать на каждый чих
+_tls = threading.local()
+
+
+def _init_worker():
+    _tls.morph = pymorphy3.MorphAnalyzer()
 
 
 def _get_morph():
-    global _morph_analyzer
-    if _morph_analyzer is None:
-        _morph_analyzer = pymorphy3.MorphAnalyzer()
-    return _morph_analyzer
+    morph = getattr(_tls, "morph", None)
+    if morph is None:
+        morph = pymorphy3.MorphAnalyzer()
+        _tls.morph = morph
+    return morph
+
+
+# Словарь "заряженных" слов воркера-процесса, прочитанный из разделяемой памяти
+_charged_words_shared = None
+
+
+def _init_process_worker(shm_name: str):
+    """Подключает воркер-процесс к словарю в разделяемой памяти (один раз,
+    вместо пиклинга всего списка на каждую задачу) и сразу поднимает
+    морфолог, чтобы первый запрос не платил секунды за его загрузку."""
+    global _charged_words_shared
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        # Сегмент может быть выровнен до страницы — хвостовые нули отрезаем
+        blob = bytes(shm.buf).rstrip(b"\x00")
+    finally:
+        shm.close()
+    _charged_words_shared = frozenset(
+        sys.intern(lemma) for lemma in blob.decode("utf-8").split("\n")
+    )
+    _init_worker()
 
 
-def analyze_text_task(charged_words: List[str], text: str) -> Tuple[float, int]:
+def load_charged_words() -> FrozenSet[str]:
+    """Загружает словарь лемм: прекомпилированный marshal или исходный txt.
+
+    Леммы интернируются, как и в кэше text_tools_fast: проверка вхождения
+    в набор тогда сравнивает токены по указателю, без пересчета хэшей."""
+    try:
+        with open(build_dict.COMPILED_PATH, "rb") as f:
+            return frozenset(sys.intern(lemma) for lemma in marshal.load(f))
+    except FileNotFoundError:
+        with open(build_dict.SOURCE_PATH, "r", encoding="utf-8") as f:
+            return frozenset(
+                sys.intern(line.strip()) for line in f if line.strip()
+            )
+
+
+def analyze_text_task(charged_words: FrozenSet[str], html: str) -> Tuple[float, int]:
     """
-    Тяжелая CPU-bound задача. Выполняется в отдельном ПРОЦЕССЕ.
+    Тяжелая CPU-bound задача. Выполняется в отдельном воркере.
     """
+    result = analyze_batch(charged_words, [html])[0]
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+def analyze_batch(charged_words: FrozenSet[str], htmls: List[str]) -> list:
+    """Анализирует пачку статей за один заход в воркер: морфолог и его
+    словарные структуры остаются горячими на всю пачку.
+
+    Токены тянутся из sanitize_tokens лениво, без материализации всего
+    текста строкой; чтобы одна битая статья не ломала всю пачку,
+    ArticleNotFound возвращается как элемент результата.
+
+    charged_words=None означает "возьми словарь из разделяемой памяти",
+    подключенной в _init_process_worker."""
+    if charged_words is None:
+        charged_words = _charged_words_shared
     morph = _get_morph()
-    words = text_tools.split_by_words(morph, text)
-    score = text_tools.calculate_jaundice_rate(words, charged_words)
-    return score, len(words)
+    results = []
+    for html in htmls:
+        try:
+            results.append(
+                text_tools_fast.split_and_score(
+                    morph, sanitize_tokens(html), charged_words
+                )
+            )
+        except ArticleNotFound as e:
+            results.append(e)
+    return results
+
+
+async def morph_worker(app: web.Application):
+    """Фоновая задача: собирает тексты из очереди в пачки и гонит их в пул
+    одним analyze_batch, раскладывая результаты обратно по футурам."""
+    queue = app["analyze_queue"]
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await queue.get()]
+        while len(batch) < MAX_URLS:
+            try:
+                batch.append(queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        htmls = [html for html, _ in batch]
+        try:
+            results = await loop.run_in_executor(
+                app["executor"], analyze_batch, app["task_words"], htmls
+            )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for (_, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
 
 
 async def process_article(
     session: aiohttp.ClientSession,
-    executor: ProcessPoolExecutor,
-    charged_words: list,
+    executor: Executor,
+    charged_words: FrozenSet[str],
     url: str,
+    cache: Dict[str, tuple] = None,
+    analyze_queue: asyncio.Queue = None,
+    host_sems: Dict[str, asyncio.Semaphore] = None,
 ) -> Dict[str, Any]:
     try:
-        async with CONCURRENCY_LIMIT:
+        # Условный GET: если статья уже анализировалась, просим сервер отдать
+        # только подтверждение свежести и переиспользуем готовый результат
+        cached = None
+        conditional_headers = {}
+        if cache is not None:
+            cached = cache.get(url)
+            if cached is not None and cached[3] < time.monotonic():
+                cache.pop(url, None)
+                cached = None
+            if cached is not None:
+                etag, last_modified, _, _ = cached
+                if etag:
+                    conditional_headers["If-None-Match"] = etag
+                if last_modified:
+                    conditional_headers["If-Modified-Since"] = last_modified
+
+        # Бэкпрешер на каждый хост отдельно: статьи с разных сайтов не
+        # встают в одну очередь, а один сайт не получает все 10 коннектов
+        if host_sems is not None:
+            semaphore = host_sems[urllib.parse.urlsplit(url).netloc]
+        else:
+            semaphore = CONCURRENCY_LIMIT
+
+        async with semaphore:
             async with session.get(
-                url, timeout=aiohttp.ClientTimeout(total=FETCH_TIMEOUT)
+                url,
+                headers=conditional_headers,
+                timeout=FETCH_CLIENT_TIMEOUT,
             ) as resp:
+                if resp.status == 304 and cached is not None:
+                    return dict(cached[2])
                 resp.raise_for_status()
-                html = await resp.text()
-
-        clean_text = sanitize(html, plaintext=True)
+                # resp.text() без известной кодировки запускает chardet-скан
+                # по всему телу; inosmi отдает UTF-8, декодируем сами
+                raw = await resp.read()
+                html = raw.decode(resp.charset or "utf-8", errors="replace")
+                etag = resp.headers.get("ETag")
+                last_modified = resp.headers.get("Last-Modified")
 
         loop = asyncio.get_running_loop()
         start_analysis = time.perf_counter()
 
-        # Настоящий параллелизм: уходим из основного процесса в пул воркеров
-        score, words_count = await asyncio.wait_for(
-            loop.run_in_executor(
-                executor, analyze_text_task, charged_words, clean_text
-            ),
-            timeout=ANALYZE_TIMEOUT,
-        )
+        # Очистка HTML и морфология едут в воркер вместе: токены статьи
+        # обрабатываются потоком, без промежуточной строки clean_text
+        if analyze_queue is not None:
+            # Через очередь: morph_worker сгруппирует статьи запроса в одну пачку
+            future = loop.create_future()
+            await analyze_queue.put((html, future))
+            score, words_count = await asyncio.wait_for(
+                future, timeout=ANALYZE_TIMEOUT
+            )
+        else:
+            # Настоящий параллелизм: уходим из основного процесса в пул воркеров
+            score, words_count = await asyncio.wait_for(
+                loop.run_in_executor(
+                    executor, analyze_text_task, charged_words, html
+                ),
+                timeout=ANALYZE_TIMEOUT,
+            )
 
-        return {
+        result = {
             "url": url,
             "status": "OK",
             "score": score,
@@ -76,6 +238,15 @@ async def process_article(
             "duration": round(time.perf_counter() - start_analysis, 4),
         }
 
+        # Кэшируем только ответы с валидаторами: без ETag/Last-Modified
+        # условный GET невозможен и проверить свежесть нечем
+        if cache is not None and (etag or last_modified):
+            if len(cache) >= CACHE_MAX_SIZE:
+                cache.pop(next(iter(cache)))
+            cache[url] = (etag, last_modified, result, time.monotonic() + CACHE_TTL)
+
+        return result
+
     except asyncio.TimeoutError:
         return {"url": url, "status": "TIMEOUT"}
     except (aiohttp.ClientError, asyncio.exceptions.TimeoutError):
@@ -97,32 +268,106 @@ async def analyze_handler(request: web.Request) -> web.Response:
     if len(urls) > MAX_URLS:
         return web.json_response({"error": f"Max {MAX_URLS} URLs allowed"}, status=400)
 
-    # Запускаем задачи параллельно в пуле процессов
     tasks = [
-        process_article(
-            request.app["session"], request.app["executor"], request.app["words"], url
+        asyncio.create_task(
+            process_article(
+                request.app["session"],
+                request.app["executor"],
+                request.app["task_words"],
+                url,
+                cache=request.app["cache"],
+                analyze_queue=request.app["analyze_queue"],
+                host_sems=request.app["host_sems"],
+            )
         )
         for url in urls
     ]
-    results = await asyncio.gather(*tasks)
-    return web.json_response(results)
+
+    # Стримим NDJSON по мере готовности: клиент видит быстрые статьи сразу,
+    # не дожидаясь самой медленной
+    resp = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+    await resp.prepare(request)
+    for task in asyncio.as_completed(tasks):
+        result = await task
+        await resp.write(json.dumps(result, ensure_ascii=False).encode() + b"\n")
+    await resp.write_eof()
+    return resp
 
 
 async def start_background_tasks(app: web.Application):
     """Инициализация ресурсов при старте сервера."""
-    app["session"] = aiohttp.ClientSession()
-    # Создаем пул процессов по количеству ядер CPU
-    app["executor"] = ProcessPoolExecutor()
-    with open("charged_dict/negative.txt", "r") as f:
-        app["words"] = [line.strip() for line in f if line.strip()]
+    # Переиспользуем TCP/TLS-соединения между запросами: держим keep-alive,
+    # кэшируем DNS и не открываем по новому хендшейку на каждую статью
+    connector = aiohttp.TCPConnector(
+        limit=100,
+        limit_per_host=10,
+        ttl_dns_cache=300,
+        keepalive_timeout=60,
+    )
+    app["session"] = aiohttp.ClientSession(
+        connector=connector, timeout=FETCH_CLIENT_TIMEOUT
+    )
+    # Пул потоков по количеству ядер: словарные операции pymorphy3 с C-расширением
+    # (pip install pymorphy3[fast]) отпускают GIL, а clean_text не пиклится на каждый вызов.
+    # Пул процессов остается запасным вариантом для окружений без C-расширения.
+    app["words"] = load_charged_words()
+    if app.get("pool") == "process":
+        # Словарь кладем в разделяемую память один раз: воркеры подключаются
+        # в initializer=, и задачи больше не пиклят его на каждый вызов
+        blob = "\n".join(sorted(app["words"])).encode("utf-8")
+        shm = shared_memory.SharedMemory(create=True, size=max(1, len(blob)))
+        shm.buf[: len(blob)] = blob
+        app["charged_shm"] = shm
+        # Ядер минус одно: главному процессу с event loop тоже нужно ядро.
+        # forkserver не копирует в воркеры хип родителя (сессии, кэши)
+        # и безопасен при живых потоках, в отличие от голого fork
+        app["executor"] = ProcessPoolExecutor(
+            max_workers=max(1, os.cpu_count() - 1),
+            mp_context=multiprocessing.get_context("forkserver"),
+            initializer=_init_process_worker,
+            initargs=(shm.name,),
+        )
+        app["task_words"] = None
+    else:
+        app["executor"] = ThreadPoolExecutor(
+            max_workers=os.cpu_count(), initializer=_init_worker
+        )
+        app["task_words"] = app["words"]
+    text_tools_fast.load_lemma_cache()
+    # url -> (etag, last_modified, result, expires_at)
+    app["cache"] = {}
+    app["host_sems"] = collections.defaultdict(
+        lambda: asyncio.Semaphore(PER_HOST_LIMIT)
+    )
+    app["analyze_queue"] = asyncio.Queue()
+    app["morph_worker"] = asyncio.create_task(morph_worker(app))
     yield
-    # Корректно завершаем сессию и пул процессов
+    # Корректно завершаем сессию, воркер и пул
+    app["morph_worker"].cancel()
     await app["session"].close()
     app["executor"].shutdown()
+    if "charged_shm" in app:
+        app["charged_shm"].close()
+        app["charged_shm"].unlink()
+    text_tools_fast.save_lemma_cache()
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сервер анализа желтушности статей")
+    parser.add_argument(
+        "--pool",
+        choices=["thread", "process"],
+        default="thread",
+        help="тип пула для анализа текста (по умолчанию thread)",
+    )
+    args = parser.parse_args()
+
+    # libuv-цикл: заметно дешевле на множестве коротких await в process_article
+    if uvloop is not None:
+        uvloop.install()
+
     app = web.Application()
+    app["pool"] = args.pool
     app.cleanup_ctx.append(start_background_tasks)
     app.add_routes([web.get("/api/analyze", analyze_handler)])
     web.run_app(app, port=8080)
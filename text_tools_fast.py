@@ -0,0 +1,121 @@
+import pickle
+import re
+import sys
+
+import pymorphy3
+
+# Один скомпилированный автомат вместо str.split + зачистки пунктуации на
+# каждом токене: весь текст сканируется за один проход, а чисто
+# пунктуационные "слова" даже не доходят до морфолога
+WORD_RE = re.compile(r"\w+(?:-\w+)*")
+
+# Кэш лемм word -> normal_form. Морфологический разбор через pymorphy3 —
+# самая дорогая часть анализа, поэтому parse() вызывается только на промахах,
+# а накопленный словарь сохраняется на диск и переживает рестарты сервера.
+LEMMA_CACHE_PATH = "lemma_cache.pickle"
+
+_lemma_cache = {}
+
+
+def load_lemma_cache(path=LEMMA_CACHE_PATH):
+    """Подгружает кэш лемм с диска, если он был сохранен ранее."""
+    try:
+        with open(path, "rb") as f:
+            stored = pickle.load(f)
+    except (FileNotFoundError, pickle.UnpicklingError, EOFError):
+        return
+    # Интернируем леммы: одинаковые строки становятся одним объектом,
+    # и проверка вхождения в "заряженный" набор сравнивает указатели
+    _lemma_cache.update(
+        (word, sys.intern(lemma)) for word, lemma in stored.items()
+    )
+
+
+def save_lemma_cache(path=LEMMA_CACHE_PATH):
+    """Сохраняет кэш лемм на диск, объединяя с уже сохраненным."""
+    merged = {}
+    try:
+        with open(path, "rb") as f:
+            merged = pickle.load(f)
+    except (FileNotFoundError, pickle.UnpicklingError, EOFError):
+        pass
+    merged.update(_lemma_cache)
+    with open(path, "wb") as f:
+        pickle.dump(merged, f)
+
+
+def split_by_words(morph, text):
+    """Быстрый аналог text_tools.split_by_words: pymorphy3 только на промахах кэша."""
+    return split_tokens(morph, (text,))
+
+
+def split_tokens(morph, tokens):
+    """То же, что split_by_words, но принимает поток сырых токенов,
+    не требуя собирать весь текст в одну строку."""
+    cache = _lemma_cache
+    findall = WORD_RE.findall
+    words = []
+    for token in tokens:
+        for word in findall(token):
+            normalized_word = cache.get(word)
+            if normalized_word is None:
+                normalized_word = sys.intern(morph.parse(word)[0].normal_form)
+                cache[word] = normalized_word
+            if len(normalized_word) > 2 or normalized_word == "не":
+                words.append(normalized_word)
+    return words
+
+
+def split_and_score(morph, tokens, charged_words):
+    """Слитый проход: лемматизация и подсчет "заряженных" слов за один обход
+    потока токенов, без промежуточного списка лемм.
+
+    Возвращает (score, words_count) — как analyze_text_task на сервере.
+    Горячий цикл держит методы в локальных именах, чтобы не платить
+    за поиск атрибутов на каждом токене."""
+    cache = _lemma_cache
+    cache_get = cache.get
+    findall = WORD_RE.findall
+    parse = morph.parse
+    charged_set = frozenset(charged_words)
+    words_count = 0
+    charged_count = 0
+    for token in tokens:
+        for word in findall(token):
+            normalized_word = cache_get(word)
+            if normalized_word is None:
+                normalized_word = sys.intern(parse(word)[0].normal_form)
+                cache[word] = normalized_word
+            if len(normalized_word) > 2 or normalized_word == "не":
+                words_count += 1
+                if normalized_word in charged_set:
+                    charged_count += 1
+    if not words_count:
+        return 0.0, 0
+    return round(charged_count / words_count * 100, 2), words_count
+
+
+def test_split_by_words_matches_slow_path():
+    import text_tools
+
+    morph = pymorphy3.MorphAnalyzer()
+    text = "«Удивительно, но это стало началом!» Во-первых, он хочет, чтобы"
+
+    assert split_by_words(morph, text) == text_tools.split_by_words(morph, text)
+    # Повторный вызов идет целиком из кэша и дает тот же результат
+    assert split_by_words(morph, text) == text_tools.split_by_words(morph, text)
+    assert "удивительно" in _lemma_cache.values()
+
+
+def test_split_and_score_matches_two_pass():
+    import text_tools
+
+    morph = pymorphy3.MorphAnalyzer()
+    text = "Шок! Скандал стал настоящим скандалом."
+    charged_words = frozenset(["шок", "скандал"])
+
+    words = split_by_words(morph, text)
+    expected = (text_tools.calculate_jaundice_rate(words, charged_words), len(words))
+
+    assert split_and_score(morph, text.split(), charged_words) == expected
+    assert split_and_score(morph, [], charged_words) == (0.0, 0)